@@ -4,7 +4,7 @@ Regenerate PLOT_COLORS with the same hues as the current palette,
 but with S=100, L=50 for each color.
 """
 
-import colorsys
+import numpy as np
 
 # Paste your current PLOT_COLORS here:
 PLOT_COLORS = [
@@ -21,27 +21,52 @@ PLOT_COLORS = [
 ]
 
 
-def hex_to_hue(hex_color):
-    """Extract the hue (0-1) from a hex color."""
-    hex_color = hex_color.lstrip("#")
-    r, g, b = [int(hex_color[i : i + 2], 16) / 255.0 for i in (0, 2, 4)]
-    h, l, s = colorsys.rgb_to_hls(r, g, b)
-    return h  # colorsys uses HLS, so h is in [0,1]
+def hex_to_hues(hex_colors):
+    """Extract the hues (0-1) from a list of hex colors, as in colorsys.rgb_to_hls."""
+    # All colors are parsed at once as a single run of bytes
+    hex_digits = "".join(c.lstrip("#") for c in hex_colors)
+    rgb = np.frombuffer(bytes.fromhex(hex_digits), dtype=np.uint8).reshape(-1, 3)
+    rgb = rgb / 255.0
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    rangec = maxc - minc
+    # Gray colors have no hue; avoid dividing by zero for them
+    safe_range = np.where(rangec == 0, 1.0, rangec)
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+    h = np.select([r == maxc, g == maxc], [bc - gc, 2.0 + rc - bc], 4.0 + gc - rc)
+    h = np.where(rangec == 0, 0.0, h)
+    return (h / 6.0) % 1.0
 
 
-def hsl_to_hex(h, s, l):
-    """Convert HSL (all in 0-1) to hex."""
-    r, g, b = colorsys.hls_to_rgb(h, l, s)
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+def hue_channel(hue):
+    """Channel value (0-1) of a color with S=1, L=0.5, as in colorsys._v."""
+    hue = hue % 1.0
+    return np.select(
+        [hue < 1.0 / 6.0, hue < 0.5, hue < 2.0 / 3.0],
+        [hue * 6.0, 1.0, (2.0 / 3.0 - hue) * 6.0],
+        0.0,
+    )
+
+
+def hues_to_hex(hues):
+    """Convert hues (0-1) to hex colors with S=100, L=50."""
+    rgb = np.stack(
+        [
+            hue_channel(hues + 1.0 / 3.0),
+            hue_channel(hues),
+            hue_channel(hues - 1.0 / 3.0),
+        ],
+        axis=1,
+    )
+    rgb = (rgb * 255).astype(np.uint8)
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in rgb]
 
 
 if __name__ == "__main__":
-    new_colors = []
-    for color in PLOT_COLORS:
-        hue = hex_to_hue(color)
-        # S=1.0, L=0.5
-        new_hex = hsl_to_hex(hue, 1.0, 0.5)
-        new_colors.append(new_hex)
+    new_colors = hues_to_hex(hex_to_hues(PLOT_COLORS))
 
     print("// PLOT_COLORS with original hues, S=100, L=50")
     print("export const PLOT_COLORS = [")
@@ -1,41 +1,272 @@
 import math
-from typing import Callable, cast, overload
-
+import operator
+import sys
+from typing import Callable
+
+
+# State of a build: the variable counter and the emitted equations and plots
+class Context:
+    __slots__ = (
+        "counter",
+        "equations",
+        "plot_names",
+        "plot_xs",
+        "plot_ys",
+        "zero_initials",
+        "rationals",
+        "operations",
+        "float_trace",
+    )
 
-current_var = [0]
-equations = []
-plots = []
-compute_float_initial = [False]
+    def __init__(self):
+        self.counter = 0
+        self.equations = []
+        # Plots are stored as parallel lists of names and coordinate Values
+        self.plot_names = []
+        self.plot_xs = []
+        self.plot_ys = []
+        # Initials already constrained to zero (several values can share one)
+        self.zero_initials = set()
+        # Rational constants by (n, d), each defined by a single equation
+        self.rationals = {}
+        # Results of operations by (eq, operand names), so that an expression
+        # computed again on the same operands reuses its variable
+        self.operations = {}
+        # Float initials of operation results still to be computed, as
+        # (result, vf, operands) in creation order
+        self.float_trace = []
+
+    def reset(self) -> None:
+        # The lists are cleared in place, as they are also exported as module names
+        self.counter = 0
+        self.equations.clear()
+        self.plot_names.clear()
+        self.plot_xs.clear()
+        self.plot_ys.clear()
+        self.zero_initials.clear()
+        self.rationals.clear()
+        self.operations.clear()
+        self.float_trace.clear()
+
+    def propagate_floats(self) -> None:
+        # A single pass over the trace: operands always precede their results
+        trace = self.float_trace
+        self.float_trace = []
+        for result, vf, operands in trace:
+            value = vf(*[operand.float_initial_as_float() for operand in operands])
+            result._float_initial = value
+            if isinstance(result.initial, Value):
+                # The unknown constant initial has the float value of the result
+                result.initial._float_initial = value
+
+    def next_var(self) -> int:
+        var = self.counter
+        self.counter = var + 1
+        return var
+
+    def render_equations(self) -> list[str]:
+        # Operations store (eq, *operands) tuples, formatted only here
+        return [e if isinstance(e, str) else e[0](*e[1:]) for e in self.equations]
+
+    def render_plots(self) -> list[str]:
+        return [
+            f"{name} {x} {y}"
+            for name, x, y in zip(self.plot_names, self.plot_xs, self.plot_ys)
+        ]
+
+    def add_zero_initial(self, initial: "Value|int|None") -> None:
+        equation = initial._name if isinstance(initial, Value) else str(initial)
+        if equation in self.zero_initials:
+            return
+        self.zero_initials.add(equation)
+        self.equations.append(equation)
+
+
+# The context used by all operations; equations is its list of equations
+context = Context()
+equations = context.equations
+compute_float_initial = False
 
 
 def next_var():
-    var = current_var[0]
-    current_var[0] += 1
-    return var
+    return context.next_var()
+
+
+def set_context(new_context: Context) -> Context:
+    # Makes new_context the one used by all operations, so that independent
+    # builds do not share their state; returns the previous context
+    global context, equations
+    previous = context
+    # Pending float initials of the previous context are computed now, as
+    # they are otherwise read from the current context
+    previous.propagate_floats()
+    context = new_context
+    equations = new_context.equations
+    return previous
+
+
+def set_compute_float_initial(value: bool) -> None:
+    # A setter is needed, as scene code imports the flag with "import *"
+    global compute_float_initial
+    compute_float_initial = value
+
+
+def render_equations() -> list[str]:
+    return context.render_equations()
+
+
+def render_plots() -> list[str]:
+    return context.render_plots()
+
+
+def _print_lines(lines: list[str]) -> None:
+    # One line per item, written to stdout in a single call
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+
+
+def print_equations() -> None:
+    _print_lines(render_equations())
+
+
+def print_plots() -> None:
+    _print_lines(render_plots())
+
+
+# Integer constants are immutable, so a single Value is shared per integer
+_int_values: dict[int, "Value"] = {}
 
 
 def i(x: "Value|int") -> "Value":
-    return (
-        Value(None, initial=x, float_initial=maybe_float_initial(lambda: float(x)))
-        if isinstance(x, int)
-        else x
-    )
+    if not isinstance(x, int):
+        return x
+    value = _int_values.get(x)
+    if value is None:
+        # float_initial is always set, so that the cached Value is valid
+        # regardless of compute_float_initial
+        value = Value(None, initial=x, float_initial=float(x))
+        _int_values[x] = value
+    return value
 
 
 def new_var(x: int) -> "Value":
     return Value(
-        next_var(), initial=x, float_initial=maybe_float_initial(lambda: float(x))
+        context.next_var(),
+        initial=x,
+        float_initial=float(x) if compute_float_initial else None,
     )
 
 
+# Names of the variables by index ("a", ..., "z", "a1", ...), grown on demand
+_var_names: list[str] = []
+
+
+def var_name(var: int) -> str:
+    if var >= len(_var_names):
+        for v in range(len(_var_names), var + 1):
+            base = v % 26
+            suffix = v // 26
+            if suffix == 0:
+                _var_names.append(chr(ord("a") + base))
+            else:
+                _var_names.append(f"{chr(ord('a') + base)}{suffix}")
+    return _var_names[var]
+
+
 def q(n: int, d: int) -> "RationalValue":
-    return RationalValue(n, d)
+    value = context.rationals.get((n, d))
+    if value is None:
+        value = RationalValue(n, d)
+        context.rationals[(n, d)] = value
+    return value
 
 
-def maybe_float_initial(f: Callable[[], float]) -> float | None:
-    if compute_float_initial[0]:
-        return f()
-    return None
+def _eq_neg(a: "Value", b: "Value") -> str:
+    return f"{a._name} + {b._name}"
+
+
+def _eq_abs(a: "Value", b: "Value") -> str:
+    return f"{a._name}^2 - {b._name}^2"
+
+
+def _eq_square(a: "Value", b: "Value") -> str:
+    return f"{a._name}^2 - {b._name}"
+
+
+def _v_square(a):
+    return a * a
+
+
+def _eq_add(a: "Value", b: "Value", c: "Value") -> str:
+    return f"{a._name} + {b._name} - {c._name}"
+
+
+def _eq_sub(a: "Value", b: "Value", c: "Value") -> str:
+    return f"{a._name} - {b._name} - {c._name}"
+
+
+def _eq_mul(a: "Value", b: "Value", c: "Value") -> str:
+    return f"{a._name}*{b._name} - {c._name}"
+
+
+def _eq_truediv(a: "Value", b: "Value", c: "Value") -> str:
+    return f"{a._name} - {b._name}*{c._name}"
+
+
+# Operations for "x ** power", built once per exponent and reused afterwards
+_integer_pow_operations: dict[int, tuple] = {}
+_rational_pow_operations: dict[tuple[int, int], tuple] = {}
+
+
+def _integer_pow_operation(power: int) -> tuple:
+    # Returns (eq, v, vf); v is None for non-positive powers (non-integer valued)
+    operation = _integer_pow_operations.get(power)
+    if operation is not None:
+        return operation
+    vf = lambda a: a**power
+    if power > 0:
+        a_part = f"^{power} - "
+        operation = (lambda a, b: f"{a._name}{a_part}{b._name}", vf, vf)
+    else:
+        a_part = f"^{-power}*"
+        operation = (
+            lambda a, b: (
+                f"1 - {a._name}{a_part}{b._name}"
+                if a.var is not None
+                else f"1 - {a.initial_as_int() ** (-power)}*{b._name}"
+            ),
+            None,
+            vf,
+        )
+    _integer_pow_operations[power] = operation
+    return operation
+
+
+def _rational_pow_operation(n: int, d: int) -> tuple:
+    # Returns (eq, vf); the exponent parts of the equation are formatted once
+    operation = _rational_pow_operations.get((n, d))
+    if operation is not None:
+        return operation
+    exponent = n / d
+    vf = lambda a: a**exponent
+    b_part = f"^{d}"
+    if n > 0:
+        a_part = f"^{n} - "
+        eq = lambda a, b: (
+            f"{a._name}{a_part}{b._name}{b_part}"
+            if a.var is not None
+            else f"{a.initial_as_int() ** n} - {b._name}{b_part}"
+        )
+    else:
+        a_part = f"^{-n}*"
+        eq = lambda a, b: (
+            f"1 - {a._name}{a_part}{b._name}{b_part}"
+            if a.var is not None
+            else f"1 - {a.initial_as_int() ** (-n)}*{b._name}{b_part}"
+        )
+    operation = (eq, vf)
+    _rational_pow_operations[(n, d)] = operation
+    return operation
 
 
 # Types of Value:
@@ -43,6 +274,8 @@ def maybe_float_initial(f: Callable[[], float]) -> float | None:
 # - unknown constant (constant value bound by equations): var = int, initial = None
 # - variable: var = int, initial = integer constant or unknown constant
 class Value:
+    __slots__ = ("var", "initial", "_float_initial", "_name")
+
     def __init__(
         self,
         var: int | None,
@@ -53,17 +286,20 @@ class Value:
             raise Exception("Value without a var must have an integer initial")
         self.var = var
         self.initial = initial
-        self.float_initial = float_initial
+        self._float_initial = float_initial
+        # The string form is computed once here and read directly by the
+        # equation builders, as it is used for every equation
+        self._name = str(initial) if var is None else var_name(var)
 
     def __str__(self):
-        if self.var is None:
-            return str(self.initial)
-        base = self.var % 26
-        suffix = self.var // 26
-        if suffix == 0:
-            return chr(ord("a") + base)
-        else:
-            return f"{chr(ord('a') + base)}{suffix}"
+        return self._name
+
+    @property
+    def float_initial(self) -> float | None:
+        # Float initials of operation results are computed when first read
+        if self._float_initial is None and context.float_trace:
+            context.propagate_floats()
+        return self._float_initial
 
     def __repr__(self):
         return f"Value(var={self.var}, initial={repr(self.initial)})"
@@ -96,80 +332,64 @@ class Value:
         v: Callable[[int], int],
         vf: Callable[[float], float],
     ) -> "Value":
-        float_initial = maybe_float_initial(lambda: vf(self.float_initial_as_float()))
         if self.var is None:
-            int_value = v(self.initial_as_int())
-            return Value(None, initial=int_value, float_initial=float_initial)
+            return i(v(self.initial_as_int()))
+        key = (eq, self._name)
+        result = context.operations.get(key)
+        if result is not None:
+            return result
         if self.initial is None:
             initial = None
+        elif isinstance(self.initial, int):
+            initial = v(self.initial)
         else:
-            initial = i(self.initial).integer_valued_operation(eq, v, vf).maybe_int()
-        result = Value(next_var(), initial=initial, float_initial=float_initial)
-        equations.append(eq(self, result))
+            initial = _new_unknown_constant(eq, (self.initial,))
+        result = Value(context.next_var(), initial=initial)
+        context.equations.append((eq, self, result))
+        if compute_float_initial:
+            context.float_trace.append((result, vf, (self,)))
+        context.operations[key] = result
         return result
 
     def non_integer_valued_operation(
         self, eq: Callable[["Value", "Value"], str], vf: Callable[[float], float]
     ) -> "Value":
-        float_initial = maybe_float_initial(lambda: vf(self.float_initial_as_float()))
+        key = (eq, self._name)
+        result = context.operations.get(key)
+        if result is not None:
+            return result
         if self.var is None or self.initial is None:
             initial = None
         else:
-            initial = i(self.initial).non_integer_valued_operation(eq, vf).maybe_int()
-        result = Value(next_var(), initial=initial, float_initial=float_initial)
-        equations.append(eq(self, result))
+            initial = _new_unknown_constant(eq, (i(self.initial),))
+        result = Value(context.next_var(), initial=initial)
+        context.equations.append((eq, self, result))
+        if compute_float_initial:
+            context.float_trace.append((result, vf, (self,)))
+        context.operations[key] = result
         return result
 
     def __neg__(self) -> "Value":
-        return self.integer_valued_operation(
-            lambda a, b: f"{a} + {b}", lambda a: -a, lambda a: -a
-        )
+        return self.integer_valued_operation(_eq_neg, operator.neg, operator.neg)
 
     def __pow__(self, power: "Value") -> "Value":
-        vf = lambda a: a ** power.float_initial_as_float()
         if isinstance(power, RationalValue):
-            return (
-                self.non_integer_valued_operation(
-                    lambda a, b: (
-                        f"{a}^{power.n} - {b}^{power.d}"
-                        if a.var is not None
-                        else f"{a.initial_as_int() ** power.n} - {b}^{power.d}"
-                    ),
-                    vf,
-                )
-                if power.n > 0
-                else self.non_integer_valued_operation(
-                    lambda a, b: (
-                        f"1 - {a}^{-power.n}*{b}^{power.d}"
-                        if a.var is not None
-                        else f"1 - {a.initial_as_int() ** (-power.n)}*{b}^{power.d}"
-                    ),
-                    vf,
-                )
-            )
+            eq, vf = _rational_pow_operation(power.n, power.d)
+            return self.non_integer_valued_operation(eq, vf)
         if power.var is not None:
             raise Exception("Only constant integer powers are supported")
-        return (
-            self.integer_valued_operation(
-                lambda a, b: f"{a}^{power} - {b}",
-                lambda a: a ** power.initial_as_int(),
-                vf,
-            )
-            if power.initial_as_int() > 0
-            else self.non_integer_valued_operation(
-                lambda a, b: (
-                    f"1 - {a}^{-power}*{b}"
-                    if a.var is not None
-                    else f"1 - {a.initial_as_int() ** (-power.initial_as_int())}*{b}"
-                ),
-                vf,
-            )
-        )
+        if power.initial == 2:
+            return self.square()
+        eq, v, vf = _integer_pow_operation(power.initial_as_int())
+        if v is None:
+            return self.non_integer_valued_operation(eq, vf)
+        return self.integer_valued_operation(eq, v, vf)
+
+    def square(self) -> "Value":
+        return self.integer_valued_operation(_eq_square, _v_square, _v_square)
 
     def abs(self) -> "Value":
-        return self.integer_valued_operation(
-            lambda a, b: f"{a}^2 - {b}^2", lambda a: abs(a), lambda a: abs(a)
-        )
+        return self.integer_valued_operation(_eq_abs, abs, abs)
 
     # Valid combinations:
     # - constant + constant -> constant
@@ -184,15 +404,12 @@ class Value:
         v: Callable[[int, int], int],
         vf: Callable[[float, float], float],
     ) -> "Value":
-        float_initial = maybe_float_initial(
-            lambda: vf(self.float_initial_as_float(), other.float_initial_as_float())
-        )
         if self.var is None and other.var is None:
-            return Value(
-                None,
-                initial=v(self.initial_as_int(), other.initial_as_int()),
-                float_initial=float_initial,
-            )
+            return i(v(self.initial_as_int(), other.initial_as_int()))
+        key = (eq, self._name, other._name)
+        result = context.operations.get(key)
+        if result is not None:
+            return result
         arg1 = self
         arg2 = other
         if arg1.initial is None and arg2.initial is not None and arg2.var is not None:
@@ -203,14 +420,15 @@ class Value:
             arg2 = Value(arg2.var, initial=arg2, float_initial=arg2.float_initial)
         if arg1.initial is None or arg2.initial is None:
             initial = None
+        elif isinstance(arg1.initial, int) and isinstance(arg2.initial, int):
+            initial = v(arg1.initial, arg2.initial)
         else:
-            initial = (
-                i(arg1.initial)
-                .integer_valued_binary_operation(i(arg2.initial), eq, v, vf)
-                .maybe_int()
-            )
-        result = Value(next_var(), initial=initial, float_initial=float_initial)
-        equations.append(eq(self, other, result))
+            initial = _new_unknown_constant(eq, (i(arg1.initial), i(arg2.initial)))
+        result = Value(context.next_var(), initial=initial)
+        context.equations.append((eq, self, other, result))
+        if compute_float_initial:
+            context.float_trace.append((result, vf, (self, other)))
+        context.operations[key] = result
         return result
 
     def non_integer_valued_binary_operation(
@@ -219,9 +437,10 @@ class Value:
         eq: Callable[["Value", "Value", "Value"], str],  # op1, op2, result
         vf: Callable[[float, float], float],
     ) -> "Value":
-        float_initial = maybe_float_initial(
-            lambda: vf(self.float_initial_as_float(), other.float_initial_as_float())
-        )
+        key = (eq, self._name, other._name)
+        result = context.operations.get(key)
+        if result is not None:
+            return result
         arg1 = self
         arg2 = other
         if arg1.initial is None and arg2.initial is not None and arg2.var is not None:
@@ -235,64 +454,66 @@ class Value:
         elif arg1.var is None and arg2.var is None:
             initial = None
         else:
-            initial = (
-                i(arg1.initial)
-                .non_integer_valued_binary_operation(i(arg2.initial), eq, vf)
-                .maybe_int()
-            )
-        result = Value(next_var(), initial=initial, float_initial=float_initial)
-        equations.append(eq(arg1, arg2, result))
+            initial = _new_unknown_constant(eq, (i(arg1.initial), i(arg2.initial)))
+        result = Value(context.next_var(), initial=initial)
+        context.equations.append((eq, arg1, arg2, result))
+        if compute_float_initial:
+            context.float_trace.append((result, vf, (self, other)))
+        context.operations[key] = result
         return result
 
     def __add__(self, other: "Value") -> "Value":
         return self.integer_valued_binary_operation(
-            other,
-            lambda a, b, c: f"{a} + {b} - {c}",
-            lambda a, b: a + b,
-            lambda a, b: a + b,
+            other, _eq_add, operator.add, operator.add
         )
 
     def __sub__(self, other: "Value") -> "Value":
         return self.integer_valued_binary_operation(
-            other,
-            lambda a, b, c: f"{a} - {b} - {c}",
-            lambda a, b: a - b,
-            lambda a, b: a - b,
+            other, _eq_sub, operator.sub, operator.sub
         )
 
-    @overload
-    def __mul__(self, other: "Vector") -> "Vector":
-        pass
+    def __mul__(self, other: "Value|Vector") -> "Value|Vector":
+        # Dispatched on the type of other by a method call instead of isinstance
+        return other._rmul_value(self)
 
-    @overload
-    def __mul__(self, other: "Value") -> "Value":
-        pass
+    def _rmul_value(self, left: "Value") -> "Value":
+        return left._mul_scalar(self)
 
-    def __mul__(self, other: "Value|Vector") -> "Value|Vector":
-        if isinstance(other, Vector):
-            return other * self
+    def _rmul_vector(self, left: "Vector") -> "Vector":
+        return Vector(left.x * self, left.y * self)
+
+    def _mul_scalar(self, other: "Value") -> "Value":
         return self.integer_valued_binary_operation(
-            other,
-            lambda a, b, c: f"{a}*{b} - {c}",
-            lambda a, b: a * b,
-            lambda a, b: a * b,
+            other, _eq_mul, operator.mul, operator.mul
         )
 
     def __truediv__(self, other: "Value") -> "Value":
         return self.non_integer_valued_binary_operation(
-            other,
-            lambda a, b, c: f"{a} - {b}*{c}",
-            lambda a, b: a / b,
+            other, _eq_truediv, operator.truediv
         )
 
 
+def _new_unknown_constant(eq: Callable[..., str], operands: tuple[Value, ...]) -> Value:
+    # The initial of an operation result whose operand initials are not all
+    # integers: an unknown constant bound to them by the same equation. Its
+    # float value is the one of the result, set by Context.propagate_floats().
+    result = Value(context.next_var(), initial=None)
+    context.equations.append((eq, *operands, result))
+    return result
+
+
 class RationalValue(Value):
+    __slots__ = ("n", "d")
+
     def __init__(self, n: int, d: int):
-        v = next_var()
+        v = context.next_var()
         super().__init__(v, initial=None, float_initial=n / d)
         self.n = n
         self.d = d
-        equations.append(f"{d}*{self} - {n}")
+        if n < 0:
+            context.equations.append(f"{d}*{self} + {-n}")
+        else:
+            context.equations.append(f"{d}*{self} - {n}")
 
 
 def sqrt(value: Value) -> Value:
@@ -301,7 +522,138 @@ def sqrt(value: Value) -> Value:
     )
 
 
+# Polynomial in the variables of Values, used to emit expanded equations
+# directly instead of through intermediate variables
+class _Polynomial:
+    __slots__ = ("terms",)
+
+    def __init__(self, terms: dict[tuple[str, ...], int]):
+        # Coefficients by monomial (a sorted tuple of variable names, () for 1)
+        self.terms = terms
+
+    @staticmethod
+    def constant(c: int) -> "_Polynomial":
+        return _Polynomial({(): c})
+
+    @staticmethod
+    def of(x: Value) -> "_Polynomial":
+        if x.var is None:
+            return _Polynomial.constant(x.initial_as_int())
+        return _Polynomial({(x._name,): 1})
+
+    def __add__(self, other: "_Polynomial") -> "_Polynomial":
+        terms = dict(self.terms)
+        for monomial, coefficient in other.terms.items():
+            terms[monomial] = terms.get(monomial, 0) + coefficient
+        return _Polynomial(terms)
+
+    def __neg__(self) -> "_Polynomial":
+        return self * -1
+
+    def __sub__(self, other: "_Polynomial") -> "_Polynomial":
+        return self + -other
+
+    def __mul__(self, other: "_Polynomial|int") -> "_Polynomial":
+        if isinstance(other, int):
+            return _Polynomial({m: c * other for m, c in self.terms.items()})
+        terms: dict[tuple[str, ...], int] = {}
+        for monomial1, coefficient1 in self.terms.items():
+            for monomial2, coefficient2 in other.terms.items():
+                monomial = tuple(sorted(monomial1 + monomial2))
+                terms[monomial] = terms.get(monomial, 0) + coefficient1 * coefficient2
+        return _Polynomial(terms)
+
+    __rmul__ = __mul__
+
+    def __str__(self):
+        # The constant term goes last, as in the other equations
+        equation = ""
+        constant = self.terms.get((), 0)
+        terms = [(m, c) for m, c in self.terms.items() if m != () and c != 0]
+        for monomial, coefficient in terms + [((), constant)]:
+            if coefficient == 0:
+                continue
+            factors = [
+                name if monomial.count(name) == 1 else f"{name}^{monomial.count(name)}"
+                for name in dict.fromkeys(monomial)
+            ]
+            if abs(coefficient) != 1 or not factors:
+                factors.insert(0, str(abs(coefficient)))
+            term = "*".join(factors)
+            if not equation:
+                equation = term if coefficient > 0 else f"-{term}"
+            else:
+                equation += f" + {term}" if coefficient > 0 else f" - {term}"
+        return equation
+
+
+def _solution_value(n: int, d: int, float_value: float | None, constant: bool) -> Value:
+    # Value with the initial n / d: an integer or a rational constant
+    g = math.gcd(n, d) * (1 if d > 0 else -1)
+    n, d = n // g, d // g
+    initial = n if d == 1 else q(n, d)
+    if constant:
+        return i(initial) if d == 1 else initial
+    return Value(context.next_var(), initial=initial, float_initial=float_value)
+
+
+def _linear_point(
+    values: tuple[Value, ...], rows: Callable[..., tuple[tuple, tuple]]
+) -> tuple[Value, Value] | None:
+    # Point (X, Y) defined by two equations a*X + b*Y - c = 0, whose rows
+    # (a, b, c) are computed by rows() from values (as integers, floats or
+    # polynomials). Only the two equations are emitted, without intermediate
+    # variables. Returns None if the initials are not all integers or the
+    # system is degenerate at the initial position.
+    if not all(isinstance(v.initial, int) for v in values):
+        return None
+    (a1, b1, c1), (a2, b2, c2) = rows(*(v.initial for v in values))
+    det = a1 * b2 - b1 * a2
+    if det == 0:
+        return None
+    x_float = y_float = None
+    if compute_float_initial:
+        (fa1, fb1, fc1), (fa2, fb2, fc2) = rows(
+            *(v.float_initial_as_float() for v in values)
+        )
+        f_det = fa1 * fb2 - fb1 * fa2
+        x_float = (fc1 * fb2 - fb1 * fc2) / f_det
+        y_float = (fa1 * fc2 - fc1 * fa2) / f_det
+    constant = all(v.var is None for v in values)
+    x = _solution_value(c1 * b2 - b1 * c2, det, x_float, constant)
+    y = _solution_value(a1 * c2 - c1 * a2, det, y_float, constant)
+    if constant:
+        return x, y
+    x_poly = _Polynomial.of(x)
+    y_poly = _Polynomial.of(y)
+    for a, b, c in rows(*(_Polynomial.of(v) for v in values)):
+        equation = str(a * x_poly + b * y_poly - c)
+        if equation:
+            context.equations.append(equation)
+    return x, y
+
+
+# Rows (a, b, c) of the equations a*X + b*Y - c = 0 defining constructed points
+
+
+def _intersection_rows(o1x, o1y, n1x, n1y, o2x, o2y, n2x, n2y):
+    return (n1x, n1y, o1x * n1x + o1y * n1y), (n2x, n2y, o2x * n2x + o2y * n2y)
+
+
+def _projection_rows(px, py, ox, oy, nx, ny):
+    return (nx, ny, ox * nx + oy * ny), (ny, -nx, px * ny - py * nx)
+
+
+def _reflection_rows(px, py, ox, oy, nx, ny):
+    return (
+        (nx, ny, 2 * (ox * nx + oy * ny) - (px * nx + py * ny)),
+        (ny, -nx, px * ny - py * nx),
+    )
+
+
 class Point:
+    __slots__ = ("x", "y")
+
     def __init__(self, x: Value, y: Value):
         self.x = x
         self.y = y
@@ -317,23 +669,39 @@ class Point:
 
 
 class FixedPoint(Point):
+    __slots__ = ()
+
     def __init__(self, x: int, y: int):
         super().__init__(i(x), i(y))
 
 
 class FreePoint(Point):
+    __slots__ = ()
+
     def __init__(self, x: int, y: int):
         super().__init__(new_var(x), new_var(y))
 
 
 class Midpoint(Point):
+    __slots__ = ()
+
     def __init__(self, point1: Point, point2: Point):
         super().__init__((point1.x + point2.x) / i(2), (point1.y + point2.y) / i(2))
 
 
 class IntersectionPoint(Point):
+    __slots__ = ()
+
     def __init__(self, line1: "Line", line2: "Line"):
         # Let line1 := (x - a) * n = 0, line2 := (x - b) * m = 0
+        point = _linear_point(
+            (line1.o.x, line1.o.y, line1.n.x, line1.n.y)
+            + (line2.o.x, line2.o.y, line2.n.x, line2.n.y),
+            _intersection_rows,
+        )
+        if point is not None:
+            super().__init__(*point)
+            return
         # Then with x = a + n' t, (a - b) * m + t (n' * m) = 0 => t = (b - a) * m / (n' * m)
         # intersection = a + n' * (b - a) * m / (n' * m)
         n_prime = line1.n.rotated90()
@@ -342,7 +710,17 @@ class IntersectionPoint(Point):
 
 
 class Projection(Point):
+    __slots__ = ()
+
     def __init__(self, point: Point, line: "Line"):
+        # proj is on the line, and proj - a is parallel to n
+        projection = _linear_point(
+            (point.x, point.y, line.o.x, line.o.y, line.n.x, line.n.y),
+            _projection_rows,
+        )
+        if projection is not None:
+            super().__init__(*projection)
+            return
         # proj = a - n ((a - p) * n) / (n * n) (p = point, (a, n) = line)
         factor = (point - line.o) * line.n / line.n.length_sqr()
         projection_vector = Vector(point.x, point.y) - line.n * factor
@@ -350,7 +728,17 @@ class Projection(Point):
 
 
 class Reflection(Point):
+    __slots__ = ()
+
     def __init__(self, point: Point, line: "Line"):
+        # (reflection + a) / 2 is on the line, and reflection - a is parallel to n
+        reflection = _linear_point(
+            (point.x, point.y, line.o.x, line.o.y, line.n.x, line.n.y),
+            _reflection_rows,
+        )
+        if reflection is not None:
+            super().__init__(*reflection)
+            return
         # reflection = a - 2 n ((a - p) * n) / (n * n) (p = point, (a, n) = line)
         factor = i(2) * ((point - line.o) * line.n) / line.n.length_sqr()
         reflection_vector = Vector(point.x, point.y) - line.n * factor
@@ -358,6 +746,8 @@ class Reflection(Point):
 
 
 class ScaledVectorPoint(Point):
+    __slots__ = ()
+
     def __init__(self, k: Value, point1: Point, point2: Point):
         # svp = point1 + k * (point2 - point1)
         super().__init__(
@@ -366,6 +756,8 @@ class ScaledVectorPoint(Point):
 
 
 class Vector:
+    __slots__ = ("x", "y")
+
     def __init__(self, x: Value, y: Value):
         self.x = x
         self.y = y
@@ -377,7 +769,9 @@ class Vector:
         return Vector(self.y, -self.x)
 
     def length_sqr(self) -> Value:
-        return self * self
+        # Repeated calls on the same components reuse the result through
+        # Context.operations
+        return self.x.square() + self.y.square()
 
     def length(self) -> Value:
         return sqrt(self.length_sqr())
@@ -388,43 +782,47 @@ class Vector:
     def __sub__(self, other: "Vector") -> "Vector":
         return Vector(self.x - other.x, self.y - other.y)
 
-    @overload
-    def __mul__(self, other: "Vector") -> "Value":
-        pass
+    def __mul__(self, other: "Vector|Value") -> "Vector|Value":
+        return other._rmul_vector(self)
 
-    @overload
-    def __mul__(self, other: "Value") -> "Vector":
-        pass
+    def _rmul_value(self, left: Value) -> "Vector":
+        return self * left
 
-    def __mul__(self, other: "Vector|Value") -> "Vector|Value":
-        if isinstance(other, Value):
-            return Vector(self.x * other, self.y * other)
-        return self.x * other.x + self.y * other.y
+    def _rmul_vector(self, left: "Vector") -> Value:
+        return left.x * self.x + left.y * self.y
 
     def __truediv__(self, other: Value) -> "Vector":
-        return self * (i(1) / other)
+        # Dividing each component directly avoids creating 1 / other
+        return Vector(self.x / other, self.y / other)
 
 
 class FixedVector(Vector):
+    __slots__ = ()
+
     def __init__(self, x: int, y: int):
         super().__init__(i(x), i(y))
 
 
 class FreeVector(Vector):
+    __slots__ = ()
+
     def __init__(self, x: int, y: int):
         super().__init__(new_var(x), new_var(y))
 
 
 class Line:
+    __slots__ = ("o", "n")
+
     def __init__(self, o: Point, n: Vector):
         self.o = o
         self.n = n
 
     def contains(self, p: Point):
         v = (p - self.o) * self.n
-        equations.append(f"{v}")
+        # The name of a Value is already the equation "v = 0"
+        context.equations.append(v._name)
         if v.initial is not None:
-            equations.append(f"{v.initial}")
+            context.add_zero_initial(v.initial)
 
     def distance_to_point_sqr(self, p: Point) -> Value:
         return ((p - self.o) * self.n) ** i(2) / self.n.length_sqr()
@@ -434,43 +832,86 @@ class Line:
 
 
 class LineAB(Line):
+    __slots__ = ()
+
     def __init__(self, a: Point, b: Point):
         super().__init__(a, (b - a).rotated90())
 
 
 class PpBisector(Line):
+    __slots__ = ()
+
     def __init__(self, a: Point, b: Point):
         super().__init__(a + (b - a) / i(2), b - a)
 
 
 class PpToLine(Line):
+    __slots__ = ()
+
     def __init__(self, point: Point, line: Line):
         super().__init__(point, line.n.rotated90())
 
 
 class PlToLine(Line):
+    __slots__ = ()
+
     def __init__(self, point: Point, line: Line):
         super().__init__(point, line.n)
 
 
-def d(a: Point | Line, b: Point | Line) -> Value:
-    if isinstance(a, Line) and isinstance(b, Point):
-        return a.distance_to_point(b)
-    if isinstance(a, Point) and isinstance(b, Line):
-        return b.distance_to_point(a)
-    if isinstance(a, Point) and isinstance(b, Point):
-        return sqrt(d_sqr(a, b))
+def _line_kind(x: Point | Line) -> bool | None:
+    # True for lines, False for points
+    if isinstance(x, Line):
+        return True
+    if isinstance(x, Point):
+        return False
+    return None
+
+
+def _two_lines(a: Point | Line, b: Point | Line) -> Value:
     raise Exception("d() cannot be called with two lines")
 
 
+def _d_sqr_points(a: Point, b: Point) -> Value:
+    return (a.x - b.x).square() + (a.y - b.y).square()
+
+
+_d_by_kind = {
+    (True, False): lambda a, b: a.distance_to_point(b),
+    (False, True): lambda a, b: b.distance_to_point(a),
+    (False, False): lambda a, b: sqrt(_d_sqr_points(a, b)),
+}
+_d_sqr_by_kind = {
+    (True, False): lambda a, b: a.distance_to_point_sqr(b),
+    (False, True): lambda a, b: b.distance_to_point_sqr(a),
+    (False, False): _d_sqr_points,
+}
+
+# d() and d_sqr() implementations, cached by the types of the arguments
+_d_by_types: dict[tuple[type, type], Callable[..., Value]] = {}
+_d_sqr_by_types: dict[tuple[type, type], Callable[..., Value]] = {}
+
+
+def _dispatch(
+    by_types: dict[tuple[type, type], Callable[..., Value]],
+    by_kind: dict[tuple[bool, bool], Callable[..., Value]],
+    a: Point | Line,
+    b: Point | Line,
+) -> Callable[..., Value]:
+    types = (type(a), type(b))
+    f = by_types.get(types)
+    if f is None:
+        f = by_kind.get((_line_kind(a), _line_kind(b)), _two_lines)
+        by_types[types] = f
+    return f
+
+
+def d(a: Point | Line, b: Point | Line) -> Value:
+    return _dispatch(_d_by_types, _d_by_kind, a, b)(a, b)
+
+
 def d_sqr(a: Point | Line, b: Point | Line) -> Value:
-    if isinstance(a, Line) and isinstance(b, Point):
-        return a.distance_to_point_sqr(b)
-    if isinstance(a, Point) and isinstance(b, Line):
-        return b.distance_to_point_sqr(a)
-    if isinstance(a, Point) and isinstance(b, Point):
-        return (a.x - b.x) ** i(2) + (a.y - b.y) ** i(2)
-    raise Exception("d() cannot be called with two lines")
+    return _dispatch(_d_sqr_by_types, _d_sqr_by_kind, a, b)(a, b)
 
 
 def cot(a: Vector, b: Vector) -> Value:
@@ -486,7 +927,26 @@ def is_constant(x: Value):
         return
     if x.initial is None:
         raise Exception('is_constant() call for an "unknown value" is not allowed')
-    equations.append(f"{x} - {x.initial}")
+    context.equations.append(f"{x} - {x.initial}")
+
+
+def is_constant_d_sqr(a: Point | Line, b: Point | Line):
+    # Same constraint as is_constant(d_sqr(a, b)). For two points with integer
+    # initial coordinates, it is emitted as a single expanded equation, without
+    # intermediate variables for the differences and their squares.
+    if not (
+        isinstance(a, Point)
+        and isinstance(b, Point)
+        and all(isinstance(c.initial, int) for c in (a.x, a.y, b.x, b.y))
+    ):
+        is_constant(d_sqr(a, b))
+        return
+    u = _Polynomial.of(a.x) - _Polynomial.of(b.x)
+    w = _Polynomial.of(a.y) - _Polynomial.of(b.y)
+    initial = (a.x.initial - b.x.initial) ** 2 + (a.y.initial - b.y.initial) ** 2
+    equation = str(u * u + w * w - _Polynomial.constant(initial))
+    if equation:
+        context.equations.append(equation)
 
 
 def is_zero(x: Value):
@@ -494,9 +954,9 @@ def is_zero(x: Value):
         raise Exception(f"is_zero() call for a non-zero constant {x} is not allowed")
     if x.var is None:
         return
-    equations.append(f"{x}")
+    context.equations.append(x._name)
     if not isinstance(x.initial, int):
-        equations.append(f"{x.initial}")
+        context.add_zero_initial(x.initial)
 
 
 def is_zero_vector(v: Vector):
@@ -505,4 +965,6 @@ def is_zero_vector(v: Vector):
 
 
 def plot(name: str, point: Point) -> None:
-    plots.append(f"{name} {point.x} {point.y}")
+    context.plot_names.append(name)
+    context.plot_xs.append(point.x)
+    context.plot_ys.append(point.y)
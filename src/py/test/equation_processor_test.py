@@ -6,17 +6,28 @@ import traceback
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from equation_processor import (
+    Context,
     FixedPoint,
     FreePoint,
+    IntersectionPoint,
     LineAB,
+    Midpoint,
+    Projection,
+    Reflection,
     d_sqr,
     i,
+    q,
     is_constant,
+    is_constant_d_sqr,
+    is_zero,
     d,
     Value,
     equations,
-    current_var,
+    context,
     next_var,
+    render_equations,
+    set_compute_float_initial,
+    set_context,
     sqrt,
     Vector,
 )
@@ -34,9 +45,10 @@ def run_tests():
             failures.append(f"{test_name}: expected True, got False")
 
     def assert_equation_exists(equation, test_name):
-        if equation not in equations:
+        rendered_equations = render_equations()
+        if equation not in rendered_equations:
             failures.append(
-                f"{test_name}: equation '{equation}' not found in {equations}"
+                f"{test_name}: equation '{equation}' not found in {rendered_equations}"
             )
 
     # Test variable naming
@@ -62,29 +74,29 @@ def run_tests():
     # Test FreePoint
     try:
         p = FreePoint(3, 4)
-        assert_equal(p.x, Value(current_var[0] - 2, initial=3), "FreePoint.x")
-        assert_equal(p.y, Value(current_var[0] - 1, initial=4), "FreePoint.y")
+        assert_equal(p.x, Value(context.counter - 2, initial=3), "FreePoint.x")
+        assert_equal(p.y, Value(context.counter - 1, initial=4), "FreePoint.y")
     except Exception as e:
         failures.append(f"FreePoint test failed: {str(e)}\n{traceback.format_exc()}")
 
     # Test arithmetic operations with Variable
     try:
-        # Clear equations for testing
-        equations.clear()
+        # Reset the context for testing
+        context.reset()
 
         # Test addition
         v1 = Value(next_var(), initial=5)
         v2 = Value(next_var(), initial=3)
         result = v1 + v2
         assert_equal(
-            result, Value(current_var[0] - 1, initial=8), "Variable addition value"
+            result, Value(context.counter - 1, initial=8), "Variable addition value"
         )
         assert_equation_exists(f"{v1} + {v2} - {result}", "Variable addition equation")
 
         # Test subtraction
         result = v1 - v2
         assert_equal(
-            result, Value(current_var[0] - 1, initial=2), "Variable subtraction value"
+            result, Value(context.counter - 1, initial=2), "Variable subtraction value"
         )
         assert_equation_exists(
             f"{v1} - {v2} - {result}", "Variable subtraction equation"
@@ -94,7 +106,7 @@ def run_tests():
         result = v1 * v2
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=15),
+            Value(context.counter - 1, initial=15),
             "Variable multiplication value",
         )
         assert_equation_exists(
@@ -105,7 +117,7 @@ def run_tests():
         result = v1 / v2
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=Value(current_var[0] - 2)),
+            Value(context.counter - 1, initial=Value(context.counter - 2)),
             "Variable division value",
         )
         assert_equation_exists(f"{v1} - {v2}*{result}", "Variable division equation")
@@ -114,20 +126,20 @@ def run_tests():
         # Test operations with integers
         result = v1 + i(2)
         assert_equal(
-            result, Value(current_var[0] - 1, initial=7), "Variable + int value"
+            result, Value(context.counter - 1, initial=7), "Variable + int value"
         )
         assert_equation_exists(f"{v1} + 2 - {result}", "Variable + int equation")
 
         result = i(2) + v1
         assert_equal(
-            result, Value(current_var[0] - 1, initial=7), "int + Variable value"
+            result, Value(context.counter - 1, initial=7), "int + Variable value"
         )
         assert_equation_exists(f"2 + {v1} - {result}", "int + Variable equation")
 
         result = v1 / i(2)
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=Value(current_var[0] - 2)),
+            Value(context.counter - 1, initial=Value(context.counter - 2)),
             "Variable / int value",
         )
         assert_equation_exists(f"{v1} - 2*{result}", "Variable / int equation")
@@ -135,7 +147,7 @@ def run_tests():
         result = i(2) / i(3)
         assert_equal(
             result,
-            Value(current_var[0] - 1),
+            Value(context.counter - 1),
             "int / int value",
         )
         assert_equation_exists(f"2 - 3*{result}", "int / int equation")
@@ -143,7 +155,7 @@ def run_tests():
         result = -v1
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=-5),
+            Value(context.counter - 1, initial=-5),
             "Variable negation value",
         )
         assert_equation_exists(f"{v1} + {result}", "Variable negation equation")
@@ -151,20 +163,37 @@ def run_tests():
         result = v1 ** i(2)
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=25),
+            Value(context.counter - 1, initial=25),
             "Variable power value",
         )
         assert_equation_exists(f"{v1}^{2} - {result}", "Variable power equation")
 
+        result = v1.square()
+        assert_equal(
+            result,
+            Value(context.counter - 1, initial=25),
+            "Variable square value",
+        )
+        assert_equation_exists(f"{v1}^2 - {result}", "Variable square equation")
+
         result = sqrt(v1)
         assert_equal(
             result,
-            Value(current_var[0] - 1, initial=Value(current_var[0] - 2)),
+            Value(context.counter - 1, initial=Value(context.counter - 2)),
             "Variable sqrt value",
         )
         assert_equation_exists(f"{v1}^1 - {result}^2", "Variable sqrt equation")
         assert_equation_exists(f"5 - {result.initial}^2", "Variable sqrt equation")
 
+        # Rational constants are created once
+        half = q(1, 2)
+        assert_true(q(1, 2) is half, "Rational constant reuse")
+        assert_equal(
+            render_equations().count(f"2*{half} - 1"),
+            1,
+            "Rational constant equation emitted once",
+        )
+
     except Exception as e:
         failures.append(
             f"Arithmetic operations test failed: {str(e)}\n{traceback.format_exc()}"
@@ -175,7 +204,7 @@ def run_tests():
         p1 = FreePoint(0, 0)
         p2 = FreePoint(1, 2)
         is_constant(d_sqr(p1, p2))
-        v = current_var[0] - 1
+        v = context.counter - 1
         assert_equation_exists(f"{p1.x} - {p2.x} - {Value(v - 4)}", "is_constant test")
         assert_equation_exists(f"{Value(v - 4)}^2 - {Value(v - 3)}", "is_constant test")
         assert_equation_exists(f"{p1.y} - {p2.y} - {Value(v - 2)}", "is_constant test")
@@ -187,10 +216,216 @@ def run_tests():
     except Exception as e:
         failures.append(f"is_constant test failed: {str(e)}\n{traceback.format_exc()}")
 
+    # Test independent builds in separate contexts
+    try:
+        context.reset()
+        FreePoint(1, 2)
+        other = Context()
+        previous = set_context(other)
+        try:
+            p = FreePoint(3, 4)
+            is_constant(p.x)
+            assert_equal(str(p.x), "a", "Separate context variable naming")
+            assert_equal(other.render_equations(), ["a - 3"], "Separate context")
+        finally:
+            set_context(previous)
+        assert_true(previous is context, "Previous context restored")
+        assert_equal(context.counter, 2, "Default context unchanged")
+        assert_equal(render_equations(), [], "Default context equations unchanged")
+    except Exception as e:
+        failures.append(f"Context test failed: {str(e)}\n{traceback.format_exc()}")
+
+    # Test repeated subexpressions
+    try:
+        context.reset()
+        p1 = FreePoint(0, 0)
+        p2 = FreePoint(1, 2)
+        first = d_sqr(p1, p2)
+        counter = context.counter
+        equation_count = len(equations)
+        assert_true(d_sqr(p1, p2) is first, "Repeated d_sqr value")
+        assert_equal(context.counter, counter, "Repeated d_sqr creates no variables")
+        assert_equal(len(equations), equation_count, "Repeated d_sqr equations")
+    except Exception as e:
+        failures.append(
+            f"Repeated subexpression test failed: {str(e)}\n{traceback.format_exc()}"
+        )
+
+    # Test float initials computed on first read
+    try:
+        context.reset()
+        set_compute_float_initial(True)
+        p1 = FreePoint(0, 0)
+        p2 = FreePoint(1, 2)
+        distance = d(p1, p2)
+        assert_true(len(context.float_trace) > 0, "Float initials deferred")
+        assert_equal(distance.float_initial, 5**0.5, "Deferred float initial")
+        assert_equal(distance.initial.float_initial, 5**0.5, "Unknown constant float")
+        assert_equal(len(context.float_trace), 0, "Float trace consumed")
+    except Exception as e:
+        failures.append(
+            f"Float initial test failed: {str(e)}\n{traceback.format_exc()}"
+        )
+    finally:
+        set_compute_float_initial(False)
+
+    # Test is_constant_d_sqr
+    try:
+        context.reset()
+        p1 = FreePoint(3, 4)
+        p2 = FixedPoint(-1, 2)
+        p3 = FreePoint(1, 1)
+        is_constant_d_sqr(p1, FixedPoint(0, 0))
+        is_constant_d_sqr(p1, p2)
+        is_constant_d_sqr(p1, p3)
+        assert_equal(context.counter, 4, "is_constant_d_sqr creates no variables")
+        assert_equation_exists(
+            f"{p1.x}^2 + {p1.y}^2 - 25", "is_constant_d_sqr fixed point at 0"
+        )
+        assert_equation_exists(
+            f"{p1.x}^2 + 2*{p1.x} + {p1.y}^2 - 4*{p1.y} - 15",
+            "is_constant_d_sqr fixed point",
+        )
+        assert_equation_exists(
+            f"{p1.x}^2 - 2*{p1.x}*{p3.x} + {p3.x}^2"
+            f" + {p1.y}^2 - 2*{p1.y}*{p3.y} + {p3.y}^2 - 13",
+            "is_constant_d_sqr free points",
+        )
+    except Exception as e:
+        failures.append(
+            f"is_constant_d_sqr test failed: {str(e)}\n{traceback.format_exc()}"
+        )
+
+    # Test Projection emitted as a linear system
+    try:
+        context.reset()
+        x = FreePoint(3, 4)
+        projection = Projection(x, LineAB(FixedPoint(0, 0), FixedPoint(2, 1)))
+        assert_equal(context.counter, 4, "Projection creates only its coordinates")
+        assert_equal(projection.x.initial, 4, "Projection x initial")
+        assert_equal(projection.y.initial, 2, "Projection y initial")
+        assert_equation_exists(
+            f"{projection.x} - 2*{projection.y}", "Projection on line"
+        )
+        assert_equation_exists(
+            f"-2*{projection.x} - {projection.y} + 2*{x.x} + {x.y}",
+            "Projection perpendicular",
+        )
+    except Exception as e:
+        failures.append(f"Projection test failed: {str(e)}\n{traceback.format_exc()}")
+
+    # Test Reflection and IntersectionPoint emitted as linear systems
+    try:
+        context.reset()
+        x = FreePoint(3, 4)
+        reflection = Reflection(x, LineAB(FixedPoint(0, 0), FixedPoint(2, 1)))
+        assert_equal(context.counter, 4, "Reflection creates only its coordinates")
+        assert_equal(reflection.x.initial, 5, "Reflection x initial")
+        assert_equal(reflection.y.initial, 0, "Reflection y initial")
+        assert_equation_exists(
+            f"{reflection.x} - 2*{reflection.y} + {x.x} - 2*{x.y}",
+            "Reflection midpoint on line",
+        )
+        assert_equation_exists(
+            f"-2*{reflection.x} - {reflection.y} + 2*{x.x} + {x.y}",
+            "Reflection perpendicular",
+        )
+
+        context.reset()
+        line1 = LineAB(FreePoint(0, 0), FixedPoint(2, 2))
+        line2 = LineAB(FixedPoint(0, 4), FixedPoint(4, 0))
+        counter = context.counter
+        intersection = IntersectionPoint(line1, line2)
+        assert_equal(
+            context.counter - counter, 2, "IntersectionPoint creates its coordinates"
+        )
+        assert_equal(intersection.x.initial, 2, "IntersectionPoint x initial")
+        assert_equal(intersection.y.initial, 2, "IntersectionPoint y initial")
+        assert_equation_exists(
+            f"-4*{intersection.x} - 4*{intersection.y} + 16",
+            "IntersectionPoint on second line",
+        )
+    except Exception as e:
+        failures.append(
+            f"Reflection/IntersectionPoint test failed: {str(e)}\n"
+            f"{traceback.format_exc()}"
+        )
+
+    # Test linear systems with rational and constant solutions
+    try:
+        context.reset()
+        projection = Projection(
+            FreePoint(-1, 0), LineAB(FixedPoint(0, 0), FreePoint(2, 1))
+        )
+        assert_true(projection.x.initial is q(-4, 5), "Rational x initial")
+        assert_true(projection.y.initial is q(-2, 5), "Rational y initial")
+        assert_equation_exists(f"5*{projection.x.initial} + 4", "Negative rational")
+
+        context.reset()
+        line = LineAB(FixedPoint(0, 0), FixedPoint(2, 1))
+        counter = context.counter
+        projection = Projection(FixedPoint(3, 4), line)
+        assert_equal(projection.x, i(4), "Constant projection x")
+        assert_equal(projection.y, i(2), "Constant projection y")
+        assert_equal(
+            context.counter, counter, "Constant projection creates no variables"
+        )
+        projection = Projection(FixedPoint(1, 0), line)
+        assert_true(projection.x is q(4, 5), "Constant rational projection x")
+        assert_true(projection.y is q(2, 5), "Constant rational projection y")
+    except Exception as e:
+        failures.append(
+            f"Linear system solution test failed: {str(e)}\n{traceback.format_exc()}"
+        )
+
+    # Test fallbacks of the linear systems
+    try:
+        # An input whose initial is not an integer
+        context.reset()
+        midpoint = Midpoint(FreePoint(0, 0), FreePoint(1, 0))
+        counter = context.counter
+        projection = Projection(midpoint, LineAB(FixedPoint(0, 0), FixedPoint(2, 1)))
+        assert_true(
+            context.counter - counter > 2, "Non-integer initial uses the fallback"
+        )
+        assert_true(
+            isinstance(projection.x.initial, Value), "Fallback projection initial"
+        )
+
+        # Parallel lines (det == 0)
+        context.reset()
+        line1 = LineAB(FixedPoint(0, 0), FreePoint(1, 0))
+        line2 = LineAB(FixedPoint(0, 1), FixedPoint(1, 1))
+        counter = context.counter
+        IntersectionPoint(line1, line2)
+        assert_true(context.counter - counter > 2, "Parallel lines use the fallback")
+    except Exception as e:
+        failures.append(
+            f"Linear system fallback test failed: {str(e)}\n{traceback.format_exc()}"
+        )
+
+    # Test is_zero with a shared initial
+    try:
+        context.reset()
+        unknown = Value(next_var())
+        x1 = Value(next_var(), initial=unknown)
+        x2 = Value(next_var(), initial=unknown)
+        is_zero(x1)
+        is_zero(x2)
+        assert_equation_exists(f"{x1}", "is_zero shared initial test")
+        assert_equation_exists(f"{x2}", "is_zero shared initial test")
+        assert_equal(
+            render_equations().count(f"{unknown}"),
+            1,
+            "is_zero shared initial emitted once",
+        )
+    except Exception as e:
+        failures.append(f"is_zero test failed: {str(e)}\n{traceback.format_exc()}")
+
     # Test vector operations
     try:
-        # Clear equations for testing
-        equations.clear()
+        # Reset the context for testing
+        context.reset()
 
         # Test point difference (creates vector)
         p1 = FixedPoint(1, 2)
@@ -233,7 +468,7 @@ def run_tests():
         assert_equal(dot_product2, Value(None, 23), "Vector dot product (2*4 + 3*5)")
 
         # Test vector operations with variables
-        equations.clear()
+        context.reset()
 
         # Create vectors with variable components
         var_x1 = Value(next_var(), initial=1)
@@ -247,10 +482,10 @@ def run_tests():
         # Test vector addition with variables
         v_sum = v_var1 + v_var2
         assert_equal(
-            v_sum.x, Value(current_var[0] - 2, initial=4), "Variable vector addition x"
+            v_sum.x, Value(context.counter - 2, initial=4), "Variable vector addition x"
         )
         assert_equal(
-            v_sum.y, Value(current_var[0] - 1, initial=6), "Variable vector addition y"
+            v_sum.y, Value(context.counter - 1, initial=6), "Variable vector addition y"
         )
         assert_equation_exists(
             f"{var_x1} + {var_x2} - {v_sum.x}", "Variable vector addition equation x"
@@ -264,12 +499,12 @@ def run_tests():
         v_scaled = v_var1 * var_scalar
         assert_equal(
             v_scaled.x,
-            Value(current_var[0] - 2, initial=2),
+            Value(context.counter - 2, initial=2),
             "Variable vector-scalar multiplication x",
         )
         assert_equal(
             v_scaled.y,
-            Value(current_var[0] - 1, initial=4),
+            Value(context.counter - 1, initial=4),
             "Variable vector-scalar multiplication y",
         )
         assert_equation_exists(
@@ -285,32 +520,32 @@ def run_tests():
         dot_var = v_var1 * v_var2
         assert_equal(
             dot_var,
-            Value(current_var[0] - 1, initial=11),
+            Value(context.counter - 1, initial=11),
             "Variable vector dot product",
         )
         assert_equation_exists(
-            f"{var_x1}*{var_x2} - {Value(current_var[0] - 3)}",
+            f"{var_x1}*{var_x2} - {Value(context.counter - 3)}",
             "Variable vector dot product equation",
         )
         assert_equation_exists(
-            f"{var_y1}*{var_y2} - {Value(current_var[0] - 2)}",
+            f"{var_y1}*{var_y2} - {Value(context.counter - 2)}",
             "Variable vector dot product equation",
         )
         assert_equation_exists(
-            f"{Value(current_var[0] - 3)} + {Value(current_var[0] - 2)} - {dot_var}",
+            f"{Value(context.counter - 3)} + {Value(context.counter - 2)} - {dot_var}",
             "Variable vector dot product equation",
         )
 
         # Test point difference with variable points
-        equations.clear()
+        context.reset()
         free_p1 = FreePoint(0, 0)
         free_p2 = FreePoint(1, 1)
         v_diff = free_p2 - free_p1
         assert_equal(
-            v_diff.x, Value(current_var[0] - 2, initial=1), "FreePoint difference x"
+            v_diff.x, Value(context.counter - 2, initial=1), "FreePoint difference x"
         )
         assert_equal(
-            v_diff.y, Value(current_var[0] - 1, initial=1), "FreePoint difference y"
+            v_diff.y, Value(context.counter - 1, initial=1), "FreePoint difference y"
         )
         assert_equation_exists(
             f"{free_p2.x} - {free_p1.x} - {v_diff.x}", "FreePoint difference equation x"
@@ -326,12 +561,12 @@ def run_tests():
         assert_equal(v_rotated.y, Value(None, -1), "Vector rotation y component")
 
         # Test vector length
-        equations.clear()
+        context.reset()
         v_length = Vector(i(3), i(4))
         length = v_length.length()
         assert_equal(
             length,
-            Value(current_var[0] - 1),
+            Value(context.counter - 1),
             "Vector length",
         )
         assert_equation_exists(
@@ -363,8 +598,7 @@ if __name__ == "__main__":
 
     for scenario in scenarios:
         try:
-            equations.clear()
-            current_var[0] = 0
+            context.reset()
             scenario()
         except Exception as e:
             failures.append(
@@ -191,10 +191,7 @@ impl SceneObject {
             SceneObject::PpBisector(p) => p.to_python(name),
             SceneObject::PpToLine(p) => p.to_python(name),
             SceneObject::PlToLine(p) => p.to_python(name),
-            SceneObject::Parameter => format!(
-                "{} = Value(next_var(), initial=0, float_initial=maybe_float_initial(lambda: 0.0))",
-                name
-            ),
+            SceneObject::Parameter => format!("{} = new_var(0)", name),
             SceneObject::TwoPointDistanceInvariant(t) => t.to_python(name),
             SceneObject::PointToLineDistanceInvariant(p) => p.to_python(name),
             SceneObject::TwoLineAngleInvariant(t) => t.to_python(name),
@@ -446,7 +443,7 @@ mod tests {
             point1: "P1".to_string(),
             point2: "P2".to_string(),
         };
-        assert_eq!(two_point_inv.to_python("I2"), "is_constant(d(P1, P2))");
+        assert_eq!(two_point_inv.to_python("I2"), "is_constant_d_sqr(P1, P2)");
 
         let point_to_line_inv = PointToLineDistanceInvariant {
             point: "P1".to_string(),
@@ -44,7 +44,7 @@ impl TwoPointDistanceInvariant {
             self.point2.clone()
         };
 
-        format!("is_constant(d({}, {}))", point1, point2)
+        format!("is_constant_d_sqr({}, {})", point1, point2)
     }
 
     pub fn get_dependencies(&self) -> Vec<String> {
@@ -84,7 +84,7 @@ mod tests {
                 "point2": "P2"
             })
         );
-        assert_eq!(inv.to_python("I1"), "is_constant(d(P1, P2))");
+        assert_eq!(inv.to_python("I1"), "is_constant_d_sqr(P1, P2)");
         assert_eq!(inv.get_dependencies(), vec!["P1", "P2"]);
     }
 }
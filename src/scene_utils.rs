@@ -25,7 +25,7 @@ impl SceneUtils {
         python_expressions: String,
     ) -> Result<(Vec<String>, Vec<Plot>), SceneError> {
         let python_code = format!(
-            "from equation_processor import *\n{}\n\n# Print all equations\nfor eq in equations:\n    print(eq)\nprint()\n# Print all plots\nfor plot in plots:\n    print(plot)",
+            "from equation_processor import *\n{}\n\n# Print all equations\nprint_equations()\nprint()\n# Print all plots\nprint_plots()",
             python_expressions
         );
         info!("Python code: {}", python_code);
@@ -831,7 +831,7 @@ impl SceneUtils {
             .collect::<Vec<String>>()
             .join("\n");
         let python_code = format!(
-            "from equation_processor import *\ncompute_float_initial[0] = True\n{}\n{}",
+            "from equation_processor import *\nset_compute_float_initial(True)\n{}\n{}",
             python_expressions, prepared_expressions
         );
         info!("Python code: {}", python_code);